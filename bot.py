@@ -1,15 +1,17 @@
 import logging
-import re
-import requests
+import asyncio
+import aiohttp
+import functools
 import os
 import time
 import json
 from telegram import Update, ReplyKeyboardMarkup
-from telegram.ext import ApplicationBuilder, CommandHandler, MessageHandler, ContextTypes, filters
+from telegram.ext import AIORateLimiter, ApplicationBuilder, CommandHandler, MessageHandler, ContextTypes, filters
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from telegram.constants import ChatAction, ParseMode
-import importlib.util
+from telegram.error import BadRequest, Forbidden
 from dotenv import load_dotenv
+from liquiditychart import magma_liquidity_chart as magma_chart
 
 # Enable logging
 logging.basicConfig(
@@ -22,15 +24,30 @@ logger = logging.getLogger(__name__)
 TELEGRAM_BOT_TOKEN = os.environ.get('TELEGRAM_BOT_TOKEN')
 MEMPOOL_API_URL = 'https://mempool.space/api/tx/'
 MEMPOOL_BLOCKS_API_URL = 'https://mempool.space/api/blocks'
+MEMPOOL_WS_URL = 'wss://mempool.space/api/v1/ws'
+WS_RECONNECT_DELAY = 5
+# Strong references to in-flight handle_new_block tasks
+_block_tasks = set()
 
 STATE_FILE = 'bot_state.json'
+STATE_FLUSH_DELAY = 1
 
 # Store watched txids: { txid: [ { 'chat_id': ..., 'notified': ... }, ... ] }
 watched_tx = {}
+# Inverse index of watched_tx: { chat_id: {txid: None, ...} }, rebuilt on load.
+# A dict rather than a set so /status lists txids in the order they were added.
+chat_to_txids = {}
 # Store chat_ids of users who want block notifications
 block_notify_users = set()
 # Track last seen block height
 last_block_height = None
+# Shared HTTP session for mempool.space, created in on_startup
+http_session = None
+HTTP_TIMEOUT = aiohttp.ClientTimeout(total=10)
+# Short-lived cache of the chain tip so one scheduler tick fetches it once
+TIP_CACHE_TTL = 10
+_tip_cache = {'h': None, 'ts': 0.0}
+_tip_lock = asyncio.Lock()
 
 HELP_TEXT = (
     "Available commands:\n"
@@ -47,13 +64,32 @@ HELP_TEXT = (
 MAIN_MENU = [["/liquiditychart", "/notifyblocks", "/status"], ["/stopblocks", "/help"]]
 
 # --- Persistence ---
+# Set whenever state changes; state_writer coalesces changes into one write
+_dirty = asyncio.Event()
+
 def save_state():
+    _dirty.set()
+
+def write_state():
     state = {
         'watched_tx': watched_tx,
         'block_notify_users': list(block_notify_users)
     }
-    with open(STATE_FILE, 'w') as f:
+    tmp_path = STATE_FILE + '.tmp'
+    with open(tmp_path, 'w') as f:
         json.dump(state, f)
+    # Atomic swap so a crash mid-write never leaves a truncated state file
+    os.replace(tmp_path, STATE_FILE)
+
+async def state_writer():
+    while True:
+        await _dirty.wait()
+        await asyncio.sleep(STATE_FLUSH_DELAY)
+        _dirty.clear()
+        try:
+            write_state()
+        except Exception as e:
+            logger.error(f"Failed to save state: {e}")
 
 def load_state():
     global watched_tx, block_notify_users
@@ -65,10 +101,23 @@ def load_state():
                 watched_tx[k] = v
             block_notify_users.clear()
             block_notify_users.update(state.get('block_notify_users', []))
+    chat_to_txids.clear()
+    for txid, watchers in watched_tx.items():
+        for w in watchers:
+            chat_to_txids.setdefault(w['chat_id'], {})[txid] = None
+
+def unindex_txid(chat_id, txid):
+    txids = chat_to_txids.get(chat_id)
+    if txids is not None:
+        txids.pop(txid, None)
+        if not txids:
+            del chat_to_txids[chat_id]
+
+# Simple txid validation (64 hex chars): stripping every hex digit must leave nothing
+_NON_HEX = str.maketrans('', '', '0123456789abcdefABCDEF')
 
-# Simple txid validation (64 hex chars)
 def is_valid_txid(txid):
-    return bool(re.fullmatch(r'[0-9a-fA-F]{64}', txid))
+    return len(txid) == 64 and not txid.translate(_NON_HEX)
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     welcome = (
@@ -87,28 +136,38 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text(HELP_TEXT, reply_markup=ReplyKeyboardMarkup(MAIN_MENU, resize_keyboard=True))
 
-def get_confirmations(txid):
-    try:
-        resp = requests.get(MEMPOOL_API_URL + txid, timeout=10)
-        if resp.status_code == 200:
-            data = resp.json()
-            confirmations = data.get('confirmations')
-            if confirmations is not None and confirmations > 0:
-                return confirmations
-            # If confirmations is 0 or missing, check for block_height
-            status = data.get('status', {})
-            block_height = status.get('block_height') or data.get('block_height')
-            if block_height:
-                # Fetch current block height
-                blocks_resp = requests.get(MEMPOOL_BLOCKS_API_URL, timeout=10)
-                if blocks_resp.status_code == 200:
-                    blocks = blocks_resp.json()
-                    if blocks and isinstance(blocks, list):
-                        current_height = blocks[0]['height']
-                        return max(0, current_height - block_height + 1)
-            return 0
-        else:
+async def get_tip_height(ttl=TIP_CACHE_TTL):
+    # Serve from cache while fresh; the lock keeps concurrent callers from all refetching
+    async with _tip_lock:
+        if _tip_cache['h'] is not None and time.time() - _tip_cache['ts'] < ttl:
+            return _tip_cache['h']
+        async with http_session.get(MEMPOOL_BLOCKS_API_URL, timeout=HTTP_TIMEOUT) as resp:
+            if resp.status != 200:
+                return None
+            blocks = await resp.json()
+        if not blocks or not isinstance(blocks, list):
             return None
+        _tip_cache['h'] = blocks[0]['height']
+        _tip_cache['ts'] = time.time()
+        return _tip_cache['h']
+
+async def get_confirmations(txid):
+    try:
+        async with http_session.get(MEMPOOL_API_URL + txid, timeout=HTTP_TIMEOUT) as resp:
+            if resp.status != 200:
+                return None
+            data = await resp.json()
+        confirmations = data.get('confirmations')
+        if confirmations is not None and confirmations > 0:
+            return confirmations
+        # If confirmations is 0 or missing, check for block_height
+        status = data.get('status', {})
+        block_height = status.get('block_height') or data.get('block_height')
+        if block_height:
+            current_height = await get_tip_height()
+            if current_height is not None:
+                return max(0, current_height - block_height + 1)
+        return 0
     except Exception as e:
         logger.error(f"Error fetching confirmations for {txid}: {e}")
         return None
@@ -120,7 +179,7 @@ async def handle_txid(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("❌ That doesn't look like a valid Bitcoin transaction ID. Please check and try again.")
         return
     # Immediate check for confirmations
-    confirmations = get_confirmations(txid)
+    confirmations = await get_confirmations(txid)
     if confirmations is not None:
         if confirmations >= 6:
             await update.message.reply_text(f"✅ Transaction <code>{txid}</code> already has {confirmations} confirmations!", parse_mode=ParseMode.HTML)
@@ -133,8 +192,9 @@ async def handle_txid(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if txid not in watched_tx:
         watched_tx[txid] = []
     # Avoid duplicate notifications for same user
-    if not any(entry['chat_id'] == chat_id for entry in watched_tx[txid]):
+    if txid not in chat_to_txids.get(chat_id, ()):
         watched_tx[txid].append({'chat_id': chat_id, 'notified': False})
+        chat_to_txids.setdefault(chat_id, {})[txid] = None
         save_state()
     if confirmations is None or confirmations < 6:
         await update.message.reply_text(f"Monitoring transaction: <code>{txid}</code>\nYou'll be notified when it reaches 6 confirmations.", parse_mode=ParseMode.HTML)
@@ -156,75 +216,135 @@ async def stopblocks(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def check_confirmations(app):
     to_remove = []
+    pending = []
+    sends = []
+    notified = []
+    changed = False
     for txid, watchers in watched_tx.items():
         if all(w['notified'] for w in watchers):
             to_remove.append(txid)
+        else:
+            pending.append(txid)
+    # Look up all pending txids concurrently rather than one at a time
+    results = await asyncio.gather(*(get_confirmations(txid) for txid in pending), return_exceptions=True)
+    for txid, confirmations in zip(pending, results):
+        if isinstance(confirmations, Exception):
+            logger.error(f"Error checking txid {txid}: {confirmations}")
             continue
-        try:
-            confirmations = get_confirmations(txid)
-            if confirmations is not None and confirmations >= 6:
-                for watcher in watchers:
-                    if not watcher['notified']:
-                        try:
-                            await app.bot.send_message(
-                                chat_id=watcher['chat_id'],
-                                text=f"✅ Transaction <code>{txid}</code> has reached 6 confirmations!",
-                                parse_mode=ParseMode.HTML
-                            )
-                        except Exception as e:
-                            logger.error(f"Failed to notify user: {e}")
-                        watcher['notified'] = True
-                save_state()
-        except Exception as e:
-            logger.error(f"Error checking txid {txid}: {e}")
+        watchers = watched_tx.get(txid)
+        if not watchers or confirmations is None or confirmations < 6:
+            continue
+        for watcher in watchers:
+            if not watcher['notified']:
+                # Mark first so an overlapping check doesn't notify twice
+                watcher['notified'] = True
+                changed = True
+                notified.append(watcher)
+                sends.append(app.bot.send_message(
+                    chat_id=watcher['chat_id'],
+                    text=f"✅ Transaction <code>{txid}</code> has reached 6 confirmations!",
+                    parse_mode=ParseMode.HTML
+                ))
+    # Send this tick's notifications together; the app's rate limiter paces them
+    results = await asyncio.gather(*sends, return_exceptions=True)
+    for watcher, result in zip(notified, results):
+        if isinstance(result, Exception):
+            logger.error(f"Failed to notify user: {result}")
+            # Unmark so the next check retries, unless the chat can never be reached
+            if not isinstance(result, (BadRequest, Forbidden)):
+                watcher['notified'] = False
     for txid in to_remove:
-        del watched_tx[txid]
+        # Re-check: handle_txid may have added a watcher while we were awaiting
+        if not all(w['notified'] for w in watched_tx.get(txid, [])):
+            continue
+        for w in watched_tx.pop(txid, []):
+            unindex_txid(w['chat_id'], txid)
+        changed = True
+    if changed:
         save_state()
 
-async def check_new_block(app):
+async def handle_new_block(app, current_height):
     global last_block_height
-    try:
-        resp = requests.get(MEMPOOL_BLOCKS_API_URL, timeout=10)
-        if resp.status_code == 200:
-            blocks = resp.json()
-            if blocks:
-                current_height = blocks[0]['height']
-                if last_block_height is not None and current_height > last_block_height:
-                    # New block found
-                    for chat_id in block_notify_users:
-                        try:
-                            await app.bot.send_message(
-                                chat_id=chat_id,
-                                text=f"🟦 New Bitcoin block found! Height: {current_height}"
-                            )
-                        except Exception as e:
-                            logger.error(f"Failed to notify user of new block: {e}")
-                last_block_height = current_height
-    except Exception as e:
-        logger.error(f"Error checking new block: {e}")
+    # Claim the height before any await so concurrent handlers can't double-notify
+    previous = last_block_height
+    if previous is not None and current_height <= previous:
+        return
+    last_block_height = current_height
+    if previous is None:
+        return
+    # New block found
+    results = await asyncio.gather(
+        *(app.bot.send_message(chat_id=chat_id, text=f"🟦 New Bitcoin block found! Height: {current_height}")
+          for chat_id in list(block_notify_users)),
+        return_exceptions=True
+    )
+    for result in results:
+        if isinstance(result, Exception):
+            logger.error(f"Failed to notify user of new block: {result}")
+    # Confirmations only change when a block arrives, so re-check now
+    await check_confirmations(app)
+
+def schedule_new_block(app, height):
+    # Run block handling beside the websocket reader so it keeps reading frames
+    # and answering heartbeats while notifications go out
+    task = asyncio.create_task(handle_new_block(app, height))
+    _block_tasks.add(task)
+    task.add_done_callback(_block_tasks.discard)
+
+async def watch_blocks(app):
+    # Subscribe to mempool.space block pushes instead of polling /api/blocks
+    while True:
+        # Seed the height over HTTP on every (re)connect: the push feed isn't
+        # guaranteed to send a snapshot, and blocks may have been missed while down
+        try:
+            height = await get_tip_height(ttl=0)
+            if height is not None:
+                schedule_new_block(app, height)
+        except Exception as e:
+            logger.error(f"Error fetching tip height: {e}")
+        try:
+            async with http_session.ws_connect(MEMPOOL_WS_URL, heartbeat=30) as ws:
+                await ws.send_json({'action': 'want', 'data': ['blocks']})
+                async for msg in ws:
+                    if msg.type != aiohttp.WSMsgType.TEXT:
+                        break
+                    data = json.loads(msg.data)
+                    if 'block' in data:
+                        height = data['block']['height']
+                    elif data.get('blocks'):
+                        height = max(b['height'] for b in data['blocks'])
+                    else:
+                        continue
+                    _tip_cache['h'] = height
+                    _tip_cache['ts'] = time.time()
+                    schedule_new_block(app, height)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Block websocket error: {e}")
+        await asyncio.sleep(WS_RECONNECT_DELAY)
 
 async def liquiditychart(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat_id = update.message.chat_id
     progress_msg = await context.bot.send_message(chat_id=chat_id, text="⏳ Generating liquidity chart...")
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    chart_path = os.path.join(script_dir, "liquiditychart", "magma_liquidity_chart.py")
-    spec = importlib.util.spec_from_file_location("magma_liquidity_chart", chart_path)
-    magma_chart = importlib.util.module_from_spec(spec)
-    spec.loader.exec_module(magma_chart)
     async def progress_callback(msg):
         try:
             await context.bot.edit_message_text(chat_id=chat_id, message_id=progress_msg.message_id, text=f"⏳ {msg}")
         except Exception:
             pass
+    # The chart is built in a worker thread; progress updates hop back onto this loop
+    loop = asyncio.get_running_loop()
+    progress_updates = []
+    def sync_progress(msg):
+        progress_updates.append(asyncio.run_coroutine_threadsafe(progress_callback(msg), loop))
     try:
-        def sync_progress(msg):
-            import asyncio
-            loop = asyncio.get_event_loop()
-            if loop.is_running():
-                asyncio.run_coroutine_threadsafe(progress_callback(msg), loop)
-            else:
-                loop.run_until_complete(progress_callback(msg))
-        chart_path = magma_chart.generate_liquidity_chart(progress_callback=sync_progress)
+        try:
+            chart_path = await loop.run_in_executor(
+                None, functools.partial(magma_chart.generate_liquidity_chart, progress_callback=sync_progress)
+            )
+        finally:
+            # Let queued progress edits land before the message is deleted or replaced
+            await asyncio.gather(*(asyncio.wrap_future(f) for f in progress_updates), return_exceptions=True)
         with open(chart_path, 'rb') as f:
             await context.bot.send_photo(chat_id=chat_id, photo=f, caption="Here is the latest Magma liquidity chart (updated hourly).")
         await context.bot.delete_message(chat_id=chat_id, message_id=progress_msg.message_id)
@@ -234,13 +354,16 @@ async def liquiditychart(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def status(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat_id = update.message.chat_id
-    user_txids = [txid for txid, watchers in watched_tx.items() if any(w['chat_id'] == chat_id and not w['notified'] for w in watchers)]
+    user_txids = [
+        txid for txid in chat_to_txids.get(chat_id, ())
+        if any(w['chat_id'] == chat_id and not w['notified'] for w in watched_tx[txid])
+    ]
     if not user_txids:
         await update.message.reply_text("You are not currently monitoring any transactions.")
         return
     status_lines = ["<b>Your monitored transactions:</b>"]
-    for txid in user_txids:
-        confirmations = get_confirmations(txid)
+    results = await asyncio.gather(*(get_confirmations(txid) for txid in user_txids))
+    for txid, confirmations in zip(user_txids, results):
         if confirmations is not None:
             status_lines.append(f"<code>{txid}</code> : {confirmations} confirmation(s)")
         else:
@@ -256,23 +379,20 @@ async def remove(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not is_valid_txid(txid):
         await update.message.reply_text("❌ That doesn't look like a valid Bitcoin transaction ID.")
         return
-    if txid in watched_tx:
-        before = len(watched_tx[txid])
+    if txid in chat_to_txids.get(chat_id, ()):
         watched_tx[txid] = [w for w in watched_tx[txid] if w['chat_id'] != chat_id]
-        after = len(watched_tx[txid])
-        if after == 0:
+        if not watched_tx[txid]:
             del watched_tx[txid]
+        unindex_txid(chat_id, txid)
         save_state()
-        if before != after:
-            await update.message.reply_text(f"Stopped monitoring <code>{txid}</code>.", parse_mode=ParseMode.HTML)
-        else:
-            await update.message.reply_text(f"You were not monitoring <code>{txid}</code>.", parse_mode=ParseMode.HTML)
+        await update.message.reply_text(f"Stopped monitoring <code>{txid}</code>.", parse_mode=ParseMode.HTML)
     else:
         await update.message.reply_text(f"You were not monitoring <code>{txid}</code>.", parse_mode=ParseMode.HTML)
 
 if __name__ == '__main__':
     load_state()
-    app = ApplicationBuilder().token(TELEGRAM_BOT_TOKEN).build()
+    # Keep bulk notifications under Telegram's flood limits, retrying on RetryAfter
+    app = ApplicationBuilder().token(TELEGRAM_BOT_TOKEN).rate_limiter(AIORateLimiter(max_retries=3)).build()
     app.add_handler(CommandHandler('start', start))
     app.add_handler(CommandHandler('help', help_command))
     app.add_handler(CommandHandler('notifyblocks', notifyblocks))
@@ -285,10 +405,26 @@ if __name__ == '__main__':
     scheduler = AsyncIOScheduler()
 
     async def on_startup(app):
+        global http_session
+        connector = aiohttp.TCPConnector(limit=100, limit_per_host=20, keepalive_timeout=60)
+        http_session = aiohttp.ClientSession(connector=connector)
         scheduler.add_job(check_confirmations, 'interval', seconds=15, args=[app])
-        scheduler.add_job(check_new_block, 'interval', seconds=15, args=[app])
         scheduler.start()
+        app.bot_data['block_watcher'] = asyncio.create_task(watch_blocks(app))
+        app.bot_data['state_writer'] = asyncio.create_task(state_writer())
         print("Bot is running. Press Ctrl+C to stop.")
 
+    async def on_shutdown(app):
+        for name in ('block_watcher', 'state_writer'):
+            task = app.bot_data.get(name)
+            if task is not None:
+                task.cancel()
+        # Flush anything the writer hadn't persisted yet
+        if _dirty.is_set():
+            write_state()
+        if http_session is not None:
+            await http_session.close()
+
     app.post_init = on_startup
+    app.post_shutdown = on_shutdown
     app.run_polling() 
\ No newline at end of file
@@ -0,0 +1,49 @@
+"""Core 0/1 knapsack DP for magma_liquidity_chart.
+
+knapsack(costs, liqs, budget) returns (dp, take): dp[b] is the best liquidity
+for a cost of at most b units, and take[i] is a packed bitmap (np.packbits
+layout) of the budgets where chunk i improved dp, used for backtracking.
+numba is optional (not in requirements.txt): when it is installed the loop is
+JIT-compiled, otherwise NumPy slices are used.
+"""
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+
+def _knapsack_numpy(costs, liqs, budget):
+    dp = np.zeros(budget + 1, dtype=np.int64)
+    take = np.zeros((len(costs), (budget + 8) // 8), dtype=np.uint8)
+    for i, (cost, liq) in enumerate(zip(costs.tolist(), liqs.tolist())):
+        if cost > budget:
+            continue
+        cand = dp[:budget + 1 - cost] + liq
+        mask = cand > dp[cost:]
+        np.copyto(dp[cost:], cand, where=mask)
+        take[i] = np.packbits(np.concatenate((np.zeros(cost, dtype=np.bool_), mask)))
+    return dp, take
+
+
+def _knapsack_loop(costs, liqs, budget):
+    # Walking b downwards lets dp be updated in place while each chunk is
+    # still used at most once; compare, assign and record happen in one pass
+    dp = np.zeros(budget + 1, dtype=np.int64)
+    take = np.zeros((costs.shape[0], (budget + 8) // 8), dtype=np.uint8)
+    for i in range(costs.shape[0]):
+        cost = costs[i]
+        liq = liqs[i]
+        for b in range(budget, cost - 1, -1):
+            cand = dp[b - cost] + liq
+            if cand > dp[b]:
+                dp[b] = cand
+                take[i, b >> 3] |= np.uint8(1 << (7 - (b & 7)))
+    return dp, take
+
+
+if njit is not None:
+    knapsack = njit(cache=True)(_knapsack_loop)
+else:
+    knapsack = _knapsack_numpy
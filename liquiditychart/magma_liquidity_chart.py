@@ -1,18 +1,98 @@
+import logging
 import os
+import threading
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import matplotlib
+matplotlib.use("Agg")  # Headless rendering; the bot draws charts off the main thread
 import matplotlib.pyplot as plt
 import numpy as np
 from dotenv import load_dotenv
+from liquiditychart._knapsack import knapsack
 import concurrent.futures
+import json
+import tempfile
 import time
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 AMBOSS_API_URL = "https://api.amboss.space/graphql"
+# Granularity of the knapsack budget axis (see knapsack_curve)
+KNAPSACK_COST_BUCKET_SATS = 100
+# Offer details are cached on disk for this many chart rebuild intervals
+# (cache_minutes), so every other rebuild, or a restart, reuses them
+OFFER_CACHE_REBUILDS = 2
+
+# --- Amboss-style theming ---
+# Applied once at import; resetting the style per chart invalidates matplotlib's caches
+plt.style.use('dark_background')
+plt.rcParams.update({
+    'font.family': 'DejaVu Sans',
+    'font.size': 14,
+    'axes.labelcolor': 'white',
+    'axes.edgecolor': '#222',
+    'axes.facecolor': '#181c20',
+    'axes.titleweight': 'bold',
+    'axes.titlesize': 20,
+    'axes.labelsize': 16,
+    'xtick.color': '#b8e0ff',
+    'ytick.color': '#b8e0ff',
+    'grid.color': '#333',
+    'legend.fontsize': 14,
+    'figure.facecolor': '#181c20',
+    'figure.edgecolor': '#181c20',
+})
+
+# The chart figure is created once and cleared between renders
+_chart_fig = None
+_chart_lock = threading.Lock()
+
+def make_session():
+    """Build a keep-alive session so repeat calls reuse pooled TCP/TLS connections."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=16, pool_maxsize=32, max_retries=Retry(total=2, backoff_factor=0.1))
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+AMBOSS_SESSION = make_session()
+COINGECKO_SESSION = make_session()
+
+def read_cache(path, ttl_seconds):
+    """Return the cached data at path, or None if it is missing or older than ttl_seconds."""
+    try:
+        with open(path, "r") as f:
+            entry = json.load(f)
+        if time.time() - entry['fetched_at'] < ttl_seconds:
+            return entry['data']
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    return None
+
+def write_cache(path, data):
+    """Best-effort cache write; failures are logged, never raised."""
+    tmp_path = None
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # A unique temp file per write, since chart builds can run concurrently
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump({'fetched_at': time.time(), 'data': data}, f)
+        os.replace(tmp_path, path)
+    except (OSError, TypeError, ValueError) as e:
+        logger.warning(f"Could not write cache {path}: {e}")
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def offer_cache_path(cache_dir, offer_id):
+    return os.path.join(cache_dir, "offers_cache", f"{offer_id}.json")
 
 def get_btc_usd():
     """Fetch the current BTC/USD price from CoinGecko."""
-    resp = requests.get('https://api.coingecko.com/api/v3/simple/price?ids=bitcoin&vs_currencies=usd')
+    resp = COINGECKO_SESSION.get('https://api.coingecko.com/api/v3/simple/price?ids=bitcoin&vs_currencies=usd')
     resp.raise_for_status()
     return resp.json()['bitcoin']['usd']
 
@@ -29,17 +109,12 @@ def get_enabled_offer_ids():
       }
     }
     """
-    resp = requests.post(AMBOSS_API_URL, json={'query': query}, headers=headers)
+    resp = AMBOSS_SESSION.post(AMBOSS_API_URL, json={'query': query}, headers=headers)
     resp.raise_for_status()
     offers = resp.json()['data']['getOffers']['list']
     return [offer['id'] for offer in offers if offer['status'] == "ENABLED"]
 
-def get_offer_details(offer_id):
-    api_key = os.environ.get("AMBOSS_API_KEY")  # Loaded from .env
-    headers = {"x-api-key": api_key}
-    query = f"""
-    query {{
-      getOffer(id: "{offer_id}") {{
+OFFER_FIELDS = """
         base_fee
         fee_rate
         amboss_fee_rate
@@ -47,26 +122,47 @@ def get_offer_details(offer_id):
         max_size
         account
         id
-        conditions {{
+        conditions {
           condition
           operator
           value
-        }}
-      }}
-    }}
-    """
+        }
+"""
+# Number of getOffer selections aliased into a single GraphQL request
+OFFER_BATCH_SIZE = 50
+
+def get_offer_details(offer_id, cache_dir="liquiditychart", cache_ttl=OFFER_CACHE_REBUILDS * 60 * 60):
+    offers = get_all_offer_details([offer_id], cache_dir, cache_ttl)
+    return offers[0] if offers else None
+
+def get_offer_details_batch(offer_ids, cache_dir="liquiditychart"):
+    """Fetch several offers in one POST by aliasing a getOffer selection per id."""
+    api_key = os.environ.get("AMBOSS_API_KEY")  # Loaded from .env
+    headers = {"x-api-key": api_key}
+    selections = "\n".join(
+        f'o{i}: getOffer(id: "{offer_id}") {{{OFFER_FIELDS}}}' for i, offer_id in enumerate(offer_ids)
+    )
+    query = f"query {{\n{selections}\n}}"
     try:
-        resp = requests.post(AMBOSS_API_URL, json={'query': query}, headers=headers)
-        print("Raw response:", resp.text)
+        resp = AMBOSS_SESSION.post(AMBOSS_API_URL, json={'query': query}, headers=headers)
+        # Guarded: resp.text decodes the whole body even if debug is filtered out
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Raw response: %s", resp.text)
         resp.raise_for_status()
         data = resp.json()
         if "errors" in data:
-            print(f"Offer {offer_id} error: {data['errors']}")
-            return None
-        return data['data']['getOffer']
+            logger.warning(f"Offer batch errors: {data['errors']}")
+        results = data.get('data') or {}
     except Exception as e:
-        print(f"Offer {offer_id} generated an exception: {e}")
-        return None
+        logger.error(f"Offer batch {offer_ids[0]}.. generated an exception: {e}")
+        return []
+    offers = []
+    for i, offer_id in enumerate(offer_ids):
+        offer = results.get(f"o{i}")
+        if offer:
+            write_cache(offer_cache_path(cache_dir, offer_id), offer)
+            offers.append(offer)
+    return offers
 
 def usd_to_sats(usd_amount, btc_usd_price):
     btc = usd_amount / btc_usd_price
@@ -76,19 +172,27 @@ def usd_to_sats(usd_amount, btc_usd_price):
 def sats_to_usd(sats, btc_usd_price):
     return sats * btc_usd_price / 100_000_000
 
-def get_all_offer_details(offer_ids):
+def get_all_offer_details(offer_ids, cache_dir="liquiditychart", cache_ttl=OFFER_CACHE_REBUILDS * 60 * 60):
     offers = []
+    stale_ids = []
+    for offer_id in offer_ids:
+        cached = read_cache(offer_cache_path(cache_dir, offer_id), cache_ttl)
+        if cached is not None:
+            offers.append(cached)
+        else:
+            stale_ids.append(offer_id)
+    batches = [stale_ids[i:i + OFFER_BATCH_SIZE] for i in range(0, len(stale_ids), OFFER_BATCH_SIZE)]
+    fetched = len(offers)
     with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
-        future_to_id = {executor.submit(get_offer_details, oid): oid for oid in offer_ids}
-        for i, future in enumerate(concurrent.futures.as_completed(future_to_id), 1):
-            offer_id = future_to_id[future]
+        future_to_batch = {executor.submit(get_offer_details_batch, batch, cache_dir): batch for batch in batches}
+        for future in concurrent.futures.as_completed(future_to_batch):
+            batch = future_to_batch[future]
+            fetched += len(batch)
             try:
-                offer = future.result()
-                if offer:
-                    offers.append(offer)
-                print(f"Fetched offer {i}/{len(offer_ids)}: {offer_id}")
+                offers.extend(future.result())
+                logger.info(f"Fetched offers {fetched}/{len(offer_ids)}")
             except Exception as exc:
-                print(f"Offer {offer_id} generated an exception: {exc}")
+                logger.error(f"Offer batch {batch[0]}.. generated an exception: {exc}")
     return offers
 
 def truncate(s, length=8):
@@ -103,8 +207,14 @@ def build_label(seller_orders, truncate_fn, max_aliases=2):
         lines.append(truncate_fn(alias))
     return "\n".join(lines)
 
-def knapsack_liquidity(budget_sats, offers, include_amboss_fee=True):
-    chunks = []
+def knapsack_curve(max_budget_sats, offers, include_amboss_fee=True, cost_bucket_sats=KNAPSACK_COST_BUCKET_SATS):
+    """Run the liquidity knapsack once for every budget up to max_budget_sats.
+
+    Costs round up to `scale`-sat units: never over budget, at most scale - 1 sats lost per chosen chunk.
+    """
+    # Chunks are kept as parallel arrays (cost, liquidity, account, multiplicity)
+    # so the DP indexes plain arrays instead of hashing a dict per chunk
+    chunk_costs, chunk_liqs, chunk_accounts, chunk_mults = [], [], [], []
     for offer in offers:
         min_size = int(offer['min_size'])
         max_size = int(offer['max_size'])
@@ -119,29 +229,57 @@ def knapsack_liquidity(budget_sats, offers, include_amboss_fee=True):
         max_chunks = max_size // min_size
         if not allow_parallel:
             max_chunks = min(max_chunks, 1)
-        for _ in range(max_chunks):
-            chunks.append({'cost': cost, 'liquidity': min_size, 'account': account})
-
-    n = len(chunks)
-    dp = [ (0, {}) for _ in range(budget_sats + 1) ]
-    for i in range(n):
-        chunk = chunks[i]
-        for b in range(budget_sats, chunk['cost'] - 1, -1):
-            prev_liq, prev_orders = dp[b - chunk['cost']]
-            new_liq = prev_liq + chunk['liquidity']
-            if new_liq > dp[b][0]:
-                new_orders = prev_orders.copy()
-                new_orders[chunk['account']] = new_orders.get(chunk['account'], 0) + 1
-                dp[b] = (new_liq, new_orders)
-    max_liq, seller_orders = max(dp, key=lambda x: x[0])
+        # The max_chunks copies are interchangeable, so split them into bundles
+        # of 1, 2, 4, ... plus a remainder: any count 0..max_chunks is still a
+        # sum of distinct bundles, but the DP sees O(log max_chunks) items.
+        # OFFER_FIELDS doesn't select allow_parallel, so for offers fetched from
+        # Amboss max_chunks is at most 1; this only matters for callers that
+        # pass offers with allow_parallel set.
+        bundle = 1
+        while max_chunks > 0:
+            mult = min(bundle, max_chunks)
+            chunk_costs.append(mult * cost)
+            chunk_liqs.append(mult * min_size)
+            chunk_accounts.append(account)
+            chunk_mults.append(mult)
+            max_chunks -= mult
+            bundle *= 2
+    costs = np.array(chunk_costs, dtype=np.int64)
+    liqs = np.array(chunk_liqs, dtype=np.int64)
+
+    scale = max(1, cost_bucket_sats, int(np.gcd.reduce(costs)))
+    units = -(-costs // scale)
+    # Any budget covering every chunk just buys all of them (the greedy fill is
+    # exact there), so the table never has to extend past the total cost
+    budget_units = min(max_budget_sats // scale, int(units.sum()))
+
+    dp, take = knapsack(units, liqs, budget_units)
+    return {
+        'dp': dp, 'scale': scale, 'take': take,
+        'costs': costs, 'units': units, 'liqs': liqs, 'accounts': chunk_accounts, 'mults': chunk_mults,
+    }
+
+def knapsack_solution(curve, budget_sats):
+    """Return (liquidity, total_cost, seller_orders) for a budget from a knapsack_curve."""
+    dp = curve['dp']
+    budget_units = min(budget_sats // curve['scale'], len(dp) - 1)
+    b = int(np.argmax(dp[:budget_units + 1]))
+    max_liq = int(dp[b])
+    costs, units = curve['costs'].tolist(), curve['units'].tolist()
+    accounts, mults, take = curve['accounts'], curve['mults'], curve['take']
+    seller_orders = {}
     total_cost = 0
-    for acct, n in seller_orders.items():
-        for chunk in chunks:
-            if chunk['account'] == acct:
-                total_cost += chunk['cost'] * n
-                break
+    for i in range(len(take) - 1, -1, -1):
+        if (take[i, b >> 3] >> (7 - (b & 7))) & 1:
+            seller_orders[accounts[i]] = seller_orders.get(accounts[i], 0) + mults[i]
+            total_cost += costs[i]
+            b -= units[i]
     return max_liq, total_cost, seller_orders
 
+def knapsack_liquidity(budget_sats, offers, include_amboss_fee=True, cost_bucket_sats=KNAPSACK_COST_BUCKET_SATS):
+    curve = knapsack_curve(budget_sats, offers, include_amboss_fee, cost_bucket_sats)
+    return knapsack_solution(curve, budget_sats)
+
 def load_tor_restricted_offer_ids(filename="tor_restricted_offers.txt"):
     if not os.path.exists(filename):
         return set()
@@ -160,13 +298,9 @@ def is_tor_restricted(offer):
             return True
     return False
 
-def get_tor_restricted_offer_ids(offer_ids):
-    restricted = set()
-    for offer_id in offer_ids:
-        if is_tor_restricted(offer_id):
-            restricted.add(offer_id)
-        time.sleep(1)  # Be polite to Amboss, avoid hammering their site
-    return restricted
+def get_tor_restricted_offer_ids(offers):
+    # Purely local: checks the conditions of already-fetched offer dicts
+    return {offer['id'] for offer in offers if is_tor_restricted(offer)}
 
 def offer_price_per_sat(offer):
     # Calculate total cost for min_size
@@ -185,6 +319,15 @@ def liquidity_for_budget(args):
     liquidity_sats, _, num_orders = knapsack_liquidity(budget_sats, offers)
     return sats_to_usd(liquidity_sats, btc_usd), num_orders
 
+def get_chart_axes():
+    """Return the reusable chart figure, cleared, with a fresh set of axes."""
+    global _chart_fig
+    if _chart_fig is None:
+        _chart_fig = plt.figure(figsize=(12,7))
+    else:
+        _chart_fig.clf()
+    return _chart_fig, _chart_fig.add_subplot()
+
 def generate_liquidity_chart(cache_dir="liquiditychart", cache_filename="liquidity_chart.png", cache_minutes=60, progress_callback=None):
     os.makedirs(cache_dir, exist_ok=True)
     cache_path = os.path.join(cache_dir, cache_filename)
@@ -203,11 +346,8 @@ def generate_liquidity_chart(cache_dir="liquiditychart", cache_filename="liquidi
     offer_ids = get_enabled_offer_ids()
     if progress_callback:
         progress_callback(f"Fetching details for {len(offer_ids)} offers...")
-    offers = get_all_offer_details(offer_ids)
+    offers = get_all_offer_details(offer_ids, cache_dir, OFFER_CACHE_REBUILDS * cache_minutes * 60)
     offers = [o for o in offers if o]
-    for offer, offer_id in zip(offers, offer_ids):
-        if offer is not None:
-            offer['id'] = offer_id
     if progress_callback:
         progress_callback("Sorting and filtering offers...")
     offers_tor = [o for o in offers if not is_tor_restricted(o)]
@@ -218,14 +358,18 @@ def generate_liquidity_chart(cache_dir="liquiditychart", cache_filename="liquidi
     budgets_usd_fine = np.linspace(0, 500, 201)
     y_tor_coarse, y_clearnet_coarse = [], []
     costs_tor_coarse, costs_clearnet_coarse = [], []
-    for i, usd in enumerate(budgets_usd_coarse):
-        if progress_callback and i % 4 == 0:
-            progress_callback(f"Calculating liquidity for ${usd}...")
+    if progress_callback:
+        progress_callback(f"Calculating liquidity up to ${budgets_usd_coarse[-1]}...")
+    # One DP per offer set covers every coarse budget
+    max_budget_sats = usd_to_sats(budgets_usd_coarse[-1], btc_usd)
+    curve_tor = knapsack_curve(max_budget_sats, offers_tor_sorted)
+    curve_clearnet = knapsack_curve(max_budget_sats, offers_clearnet_sorted)
+    for usd in budgets_usd_coarse:
         budget_sats = usd_to_sats(usd, btc_usd)
-        liquidity_sats, total_cost_sats, _ = knapsack_liquidity(budget_sats, offers_tor_sorted)
+        liquidity_sats, total_cost_sats, _ = knapsack_solution(curve_tor, budget_sats)
         y_tor_coarse.append(sats_to_usd(liquidity_sats, btc_usd))
         costs_tor_coarse.append(sats_to_usd(total_cost_sats, btc_usd))
-        liquidity_sats, total_cost_sats, _ = knapsack_liquidity(budget_sats, offers_clearnet_sorted)
+        liquidity_sats, total_cost_sats, _ = knapsack_solution(curve_clearnet, budget_sats)
         y_clearnet_coarse.append(sats_to_usd(liquidity_sats, btc_usd))
         costs_clearnet_coarse.append(sats_to_usd(total_cost_sats, btc_usd))
     if progress_callback:
@@ -234,70 +378,47 @@ def generate_liquidity_chart(cache_dir="liquiditychart", cache_filename="liquidi
     y_clearnet_interp = np.interp(budgets_usd_fine, budgets_usd_coarse, y_clearnet_coarse)
     def usd_fmt(x, pos=None):
         return f"${x:,.0f}"
-    # --- Amboss-style theming ---
-    plt.style.use('dark_background')
-    plt.rcParams.update({
-        'font.family': 'DejaVu Sans',
-        'font.size': 14,
-        'axes.labelcolor': 'white',
-        'axes.edgecolor': '#222',
-        'axes.facecolor': '#181c20',
-        'axes.titleweight': 'bold',
-        'axes.titlesize': 20,
-        'axes.labelsize': 16,
-        'xtick.color': '#b8e0ff',
-        'ytick.color': '#b8e0ff',
-        'grid.color': '#333',
-        'legend.fontsize': 14,
-        'figure.facecolor': '#181c20',
-        'figure.edgecolor': '#181c20',
-    })
-    plt.figure(figsize=(12,7))
-    plt.plot(budgets_usd_fine, y_tor_interp, color='#ff3c7d', label='Tor-Eligible Offers', linewidth=2, linestyle='-')
-    plt.plot(budgets_usd_fine, y_clearnet_interp, color='#ffffff', label='All Offers (Clearnet & Tor)', linewidth=2, linestyle='-')
-    key_budgets = [10, 50, 100, 500]
-    for key_usd in key_budgets:
-        idx = np.where(budgets_usd_coarse == key_usd)[0]
-        if len(idx) > 0:
-            i = idx[0]
-            if y_tor_coarse[i] > 0:
-                pct = 100 * costs_tor_coarse[i] / y_tor_coarse[i]
-                plt.annotate(f"{pct:.2f}%", (budgets_usd_coarse[i], y_tor_coarse[i]), 
-                             textcoords="offset points", xytext=(0,-25), ha='center', fontsize=13, color='#ff3c7d',
-                             bbox=dict(boxstyle="round,pad=0.2", fc="#222", ec="#ff3c7d", lw=1, alpha=0.8))
-            if y_clearnet_coarse[i] > 0:
-                pct = 100 * costs_clearnet_coarse[i] / y_clearnet_coarse[i]
-                plt.annotate(f"{pct:.2f}%", (budgets_usd_coarse[i], y_clearnet_coarse[i]), 
-                             textcoords="offset points", xytext=(0,10), ha='center', fontsize=13, color='#ffffff',
-                             bbox=dict(boxstyle="round,pad=0.2", fc="#222", ec="#fff", lw=1, alpha=0.8))
-    plt.xlabel('Total Cost (USD)', fontsize=16, color='#b8e0ff', labelpad=10)
-    plt.ylabel('Max Liquidity Purchased (USD)', fontsize=16, color='#b8e0ff', labelpad=10)
-    plt.title('Magma Liquidity Purchase Power', fontsize=20, color='#fff', pad=15)
-    plt.suptitle(f"Tor-restricted offers: {len(offers_clearnet) - len(offers_tor)} out of {len(offers)}", fontsize=12, color='#b8e0ff', y=0.96)
-    plt.legend(fontsize=14, loc='best', facecolor='#181c20', edgecolor='#222')
-    plt.grid(True, color='#333', linestyle='--', linewidth=0.7)
-    plt.tight_layout()
-    ax = plt.gca()
-    ax.xaxis.set_major_formatter(plt.FuncFormatter(usd_fmt))
-    ax.yaxis.set_major_formatter(plt.FuncFormatter(usd_fmt))
-    ax.tick_params(axis='both', which='major', labelsize=13, colors='#b8e0ff')
-    explanation = (
-        "Payment processing fee: Total cost as a percentage of liquidity purchased.\n"
-        "For comparison: Visa/interchange fees are typically 1.5–3%, remittance fees 5–10%.\nGenerated by LNhelperBot."
-    )
-    plt.gcf().text(
-        0.5, 0.01, explanation, ha='center', va='bottom', fontsize=12, color='#b8e0ff',
-        bbox=dict(boxstyle="round,pad=0.5", fc="#181c20", ec="#222", lw=1, alpha=0.9),
-        transform=ax.transAxes
-    )
-    plt.savefig(cache_path, bbox_inches='tight')
-    plt.close()
+    with _chart_lock:
+        fig, ax = get_chart_axes()
+        ax.plot(budgets_usd_fine, y_tor_interp, color='#ff3c7d', label='Tor-Eligible Offers', linewidth=2, linestyle='-')
+        ax.plot(budgets_usd_fine, y_clearnet_interp, color='#ffffff', label='All Offers (Clearnet & Tor)', linewidth=2, linestyle='-')
+        key_budgets = [10, 50, 100, 500]
+        for key_usd in key_budgets:
+            idx = np.where(budgets_usd_coarse == key_usd)[0]
+            if len(idx) > 0:
+                i = idx[0]
+                if y_tor_coarse[i] > 0:
+                    pct = 100 * costs_tor_coarse[i] / y_tor_coarse[i]
+                    ax.annotate(f"{pct:.2f}%", (budgets_usd_coarse[i], y_tor_coarse[i]), 
+                                textcoords="offset points", xytext=(0,-25), ha='center', fontsize=13, color='#ff3c7d',
+                                bbox=dict(boxstyle="round,pad=0.2", fc="#222", ec="#ff3c7d", lw=1, alpha=0.8))
+                if y_clearnet_coarse[i] > 0:
+                    pct = 100 * costs_clearnet_coarse[i] / y_clearnet_coarse[i]
+                    ax.annotate(f"{pct:.2f}%", (budgets_usd_coarse[i], y_clearnet_coarse[i]), 
+                                textcoords="offset points", xytext=(0,10), ha='center', fontsize=13, color='#ffffff',
+                                bbox=dict(boxstyle="round,pad=0.2", fc="#222", ec="#fff", lw=1, alpha=0.8))
+        ax.set_xlabel('Total Cost (USD)', fontsize=16, color='#b8e0ff', labelpad=10)
+        ax.set_ylabel('Max Liquidity Purchased (USD)', fontsize=16, color='#b8e0ff', labelpad=10)
+        ax.set_title('Magma Liquidity Purchase Power', fontsize=20, color='#fff', pad=15)
+        fig.suptitle(f"Tor-restricted offers: {len(offers_clearnet) - len(offers_tor)} out of {len(offers)}", fontsize=12, color='#b8e0ff', y=0.96)
+        ax.legend(fontsize=14, loc='best', facecolor='#181c20', edgecolor='#222')
+        ax.grid(True, color='#333', linestyle='--', linewidth=0.7)
+        fig.tight_layout()
+        ax.xaxis.set_major_formatter(plt.FuncFormatter(usd_fmt))
+        ax.yaxis.set_major_formatter(plt.FuncFormatter(usd_fmt))
+        ax.tick_params(axis='both', which='major', labelsize=13, colors='#b8e0ff')
+        explanation = (
+            "Payment processing fee: Total cost as a percentage of liquidity purchased.\n"
+            "For comparison: Visa/interchange fees are typically 1.5–3%, remittance fees 5–10%.\nGenerated by LNhelperBot."
+        )
+        fig.text(
+            0.5, 0.01, explanation, ha='center', va='bottom', fontsize=12, color='#b8e0ff',
+            bbox=dict(boxstyle="round,pad=0.5", fc="#181c20", ec="#222", lw=1, alpha=0.9),
+            transform=ax.transAxes
+        )
+        fig.savefig(cache_path, bbox_inches='tight')
     return cache_path
 
 if __name__ == "__main__":
     # main()  # Disabled to prevent GUI popups when run directly
-<<<<<<< HEAD
-    pass
-=======
     pass
->>>>>>> 9ae023d (Initial open source release of LNhelperBot)